@@ -5,19 +5,33 @@ Serves both the frontend static files and backend API.
 """
 import os
 import sys
+import gzip
+import asyncio
+import hashlib
+import mimetypes
 import subprocess
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from backend.agui_integration import app as backend_app
+from fastapi.responses import FileResponse, ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+from backend.agui_integration import AGUIHandler
+from backend.firecrawl_config import create_http_client
 from dotenv import load_dotenv
 import logging
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Load environment variables
 load_dotenv()
@@ -30,8 +44,23 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client across all backend calls for the app's lifetime."""
+    app.state.http = create_http_client()
+    app.state.agui_handler = AGUIHandler(http_client=app.state.http)
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+
 # Create main app
-app = FastAPI(title="Speed Read Production Server")
+app = FastAPI(
+    title="Speed Read Production Server",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # Get absolute paths for production deployment
 base_dir = Path(__file__).parent.absolute()
@@ -55,43 +84,238 @@ if not index_path.exists():
     logger.error(f"Frontend build failed: {index_path} not found")
     sys.exit(1)
 
-# Include backend routes directly instead of mounting
-# This allows better control over route precedence
-from backend.agui_integration import agui_handler
+# Load index.html once so SPA navigations never touch the disk
+INDEX_BYTES = index_path.read_bytes()
+_index_stat = index_path.stat()
+INDEX_ETAG = f'W/"{int(_index_stat.st_mtime):x}-{_index_stat.st_size:x}"'
+
+# Vite emits content-hashed asset filenames, so they can be cached forever
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """FileResponse that hands the file to the server for sendfile(2) when supported."""
+
+    async def __call__(self, scope, receive, send):
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        if self.send_header_only or self.stat_result is None or not zerocopy:
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file,
+                "count": self.stat_result.st_size,
+                "more_body": False,
+            })
+        if self.background is not None:
+            await self.background()
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong ETags and long-lived caching for hashed assets."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        response = ZeroCopyFileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            method=scope["method"],
+        )
+        response.headers["ETag"] = f'"{stat_result.st_mtime_ns:x}"'
+        response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# Content types worth compressing; images and fonts are already compressed
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "image/svg+xml",
+    "text/javascript",
+}
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    """Return the content codings a client accepts from its Accept-Encoding header."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        name, _, value = params.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                if float(value) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PreloadedAssets:
+    """ASGI app serving build assets from memory, falling back to disk."""
+
+    def __init__(self, directory: Path):
+        self.fallback = CachedStaticFiles(directory=str(directory))
+        # Route path -> {encoding: (body, etag)} plus the shared content type
+        self.cache = {}
+        for file_path in directory.rglob("*"):
+            if not file_path.is_file() or file_path.suffix in (".br", ".gz"):
+                continue
+            body = file_path.read_bytes()
+            content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+            etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+            variants = {"identity": (body, f'"{etag}"')}
+            if content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES:
+                variants.update(self._compress(file_path, body, etag))
+            self.cache[f"/{file_path.relative_to(directory).as_posix()}"] = (content_type, variants)
+
+    @staticmethod
+    def _compress(file_path: Path, body: bytes, etag: str) -> dict:
+        """Build br/gzip variants, reusing precompressed build output when present."""
+        variants = {}
+        compressors = {"gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            compressors["br"] = (".br", lambda data: brotli.compress(data, quality=11))
+        for encoding, (suffix, compress) in compressors.items():
+            precompressed = file_path.with_name(file_path.name + suffix)
+            encoded = precompressed.read_bytes() if precompressed.is_file() else compress(body)
+            if len(encoded) < len(body):
+                variants[encoding] = (encoded, f'"{etag}-{encoding}"')
+        return variants
+
+    async def __call__(self, scope, receive, send):
+        entry = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            entry = self.cache.get(path)
+
+        if entry is None:
+            await self.fallback(scope, receive, send)
+            return
 
-# Add backend routes to main app
+        content_type, variants = entry
+        request_headers = Headers(scope=scope)
+        encoding = "identity"
+        if len(variants) > 1:
+            accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+            encoding = next((e for e in ("br", "gzip") if e in variants and e in accepted), "identity")
+
+        body, etag = variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": ASSET_CACHE_CONTROL}
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if request_headers.get("if-none-match") == etag:
+            response = Response(status_code=304, headers=headers)
+        else:
+            response = Response(body, media_type=content_type, headers=headers)
+        await response(scope, receive, send)
+
+# Maximum responses buffered per WebSocket client before frames are dropped
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "32"))
+
+# Register backend routes directly on this app instead of mounting the
+# standalone backend app, which keeps route precedence under our control
 @app.post("/api/extract")
-async def extract_url_route(request: dict):
+async def extract_url_route(data: dict, request: Request):
     """REST endpoint for URL extraction."""
     try:
-        result = await agui_handler.handle_extract_and_prepare(request)
+        result = await request.app.state.agui_handler.handle_extract_and_prepare(data)
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @app.websocket("/ws/agui")
-async def websocket_endpoint(websocket):
+async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for AG-UI protocol."""
-    from fastapi import WebSocket, WebSocketDisconnect
-    import logging
-    logger = logging.getLogger(__name__)
-    
+    agui_handler = websocket.app.state.agui_handler
     await websocket.accept()
+    
+    # Bounded outbox so a slow client can't grow the server's send buffer
+    outbox = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+    
+    async def send_frames():
+        while True:
+            await websocket.send_text(await outbox.get())
+    
+    sender = asyncio.create_task(send_frames())
+    last_seq = 0
+    last_dropped = None
+    
+    def next_seq() -> int:
+        nonlocal last_seq
+        last_seq += 1
+        return last_seq
+    
+    def enqueue(frame: str, seq: int):
+        nonlocal last_dropped
+        # Tell the client about dropped frames as soon as there is room
+        if last_dropped is not None and not outbox.full():
+            outbox.put_nowait(orjson.dumps({"type": "dropped", "last_seq": last_dropped}).decode())
+            last_dropped = None
+        try:
+            outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Warn once per run of dropped frames rather than once per frame
+            if last_dropped is None:
+                logger.warning(f"WebSocket outbox full, dropping frames from {seq}")
+            last_dropped = seq
+    
+    async def emit(event: dict):
+        seq = next_seq()
+        enqueue(orjson.dumps({**event, "seq": seq}).decode(), seq)
+    
+    async def deliver(frame: str):
+        # Wait for room, but give up if the sender has stopped (client gone)
+        put = asyncio.create_task(outbox.put(frame))
+        await asyncio.wait({put, sender}, return_when=asyncio.FIRST_COMPLETED)
+        if sender.done():
+            put.cancel()
+            raise WebSocketDisconnect()
+    
     try:
         while True:
             message = await websocket.receive_text()
-            response = await agui_handler.handle_message(message)
-            await websocket.send_text(response)
+            # Streamed events and the final response share one sequence
+            response = await agui_handler.handle_message(message, next_seq=next_seq, emit=emit)
+            # The response ends the request on the client, so it is never dropped;
+            # wait for room rather than losing it, after any pending drop notice
+            if last_dropped is not None:
+                await deliver(orjson.dumps({"type": "dropped", "last_seq": last_dropped}).decode())
+                last_dropped = None
+            await deliver(response)
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
         await websocket.close()
+    finally:
+        sender.cancel()
+        # Retrieve why the sender stopped so its exception isn't left unobserved
+        if sender.done() and not sender.cancelled() and sender.exception() is not None:
+            logger.info(f"WebSocket sender stopped: {str(sender.exception())}")
 
 # Serve static assets
 if assets_path.exists():
-    app.mount("/assets", StaticFiles(directory=str(assets_path)), name="assets")
-    logger.info(f"Serving static assets from: {assets_path}")
+    preloaded_assets = PreloadedAssets(assets_path)
+    app.mount("/assets", preloaded_assets, name="assets")
+    logger.info(f"Serving {len(preloaded_assets.cache)} preloaded static assets from: {assets_path}")
 else:
     logger.warning(f"Assets directory not found: {assets_path}")
 
@@ -104,14 +328,13 @@ async def health_check():
 # Serve index.html for all other routes (SPA support)
 # This MUST be last to serve as catch-all
 @app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(full_path: str, request: Request):
     """Serve the SPA for all non-API and non-asset routes."""
     # This will catch all routes not handled above
-    if index_path.exists():
-        return FileResponse(str(index_path))
-    else:
-        logger.error(f"Index file not found: {index_path}")
-        return {"error": "Frontend not built", "path": full_path}
+    headers = {"ETag": INDEX_ETAG, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == INDEX_ETAG:
+        return Response(status_code=304, headers=headers)
+    return Response(INDEX_BYTES, media_type="text/html", headers=headers)
 
 def check_environment():
     """Check required environment variables and system readiness."""
@@ -147,7 +370,7 @@ def check_environment():
     
     # Check backend dependencies
     try:
-        from backend.agui_integration import app as backend_app
+        from backend.agui_integration import AGUIHandler
         logger.info("✓ Backend modules loaded successfully")
     except ImportError as e:
         logger.error(f"✗ Backend import failed: {e}")
@@ -163,11 +386,12 @@ def main():
     # Server configuration
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
-    workers = int(os.getenv("WORKERS", "1"))
     log_level = os.getenv("LOG_LEVEL", "info").lower()
     
     # Production settings
     is_production = os.getenv("ENVIRONMENT", "development").lower() == "production"
+    default_workers = 2 * (os.cpu_count() or 1) + 1 if is_production else 1
+    workers = int(os.getenv("WORKERS", str(default_workers)))
     
     logger.info("=" * 60)
     logger.info(f"🚀 Speed Read Production Server")
@@ -188,15 +412,21 @@ def main():
     try:
         # Run the server
         if is_production:
-            # Production mode with multiple workers
-            uvicorn.run(
-                "main:app",  # Use import string for workers
-                host=host,
-                port=port,
-                log_level=log_level,
-                access_log=True,
-                workers=workers
-            )
+            # Production mode: gunicorn supervises uvicorn workers (uvloop + httptools)
+            os.execvp("gunicorn", [
+                "gunicorn",
+                "main:app",
+                "--chdir", str(base_dir),
+                "-k", "uvicorn.workers.UvicornWorker",
+                "-w", str(workers),
+                "-b", f"{host}:{port}",
+                "--log-level", log_level,
+                "--access-logfile", "-",
+                "--timeout", "120",  # LLM cleaning of long articles is slow
+                "--graceful-timeout", "30",
+                "--keep-alive", "5",
+                "--worker-connections", "1000",
+            ])
         else:
             # Development mode with reload
             uvicorn.run(
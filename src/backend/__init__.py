@@ -5,14 +5,16 @@ This module provides Firecrawl-based URL content extraction
 and LLM-powered content processing for speed reading.
 """
 
-from .firecrawl_config import FirecrawlConfig, get_firecrawl_config
-from .llm_prompts import ContentProcessor
+from .firecrawl_config import FirecrawlConfig, get_firecrawl_config, create_http_client
+from .llm_prompts import ContentProcessor, get_content_processor
 from .agui_integration import AGUIHandler, AGUIWebSocketHandler
 
 __all__ = [
     'FirecrawlConfig',
     'get_firecrawl_config',
+    'create_http_client',
     'ContentProcessor',
+    'get_content_processor',
     'AGUIHandler',
     'AGUIWebSocketHandler'
 ]
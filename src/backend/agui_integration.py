@@ -2,25 +2,27 @@
 AG-UI Protocol integration for URL content extraction.
 """
 import asyncio
-from typing import Dict, Any, Optional, Callable
-from dataclasses import dataclass
-import json
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional, Callable, Tuple, Awaitable
 import logging
+import httpx
+import msgspec
 try:
-    from .firecrawl_config import get_firecrawl_config
-    from .llm_prompts import ContentProcessor
+    from .firecrawl_config import FirecrawlConfig, get_firecrawl_config
+    from .llm_prompts import ContentProcessor, get_content_processor, DeltaCallback
 except ImportError:
     # When running as a script
-    from firecrawl_config import get_firecrawl_config
-    from llm_prompts import ContentProcessor
+    from firecrawl_config import FirecrawlConfig, get_firecrawl_config
+    from llm_prompts import ContentProcessor, get_content_processor, DeltaCallback
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Async callback sending an intermediate event (e.g. streamed text) to the client
+EventCallback = Callable[[Dict[str, Any]], Awaitable[None]]
 
-@dataclass
-class AGUIMessage:
+
+class AGUIMessage(msgspec.Struct, forbid_unknown_fields=True):
     """AG-UI protocol message structure."""
     type: str
     action: str
@@ -31,31 +33,102 @@ class AGUIMessage:
 class AGUIHandler:
     """Handler for AG-UI protocol messages."""
     
-    def __init__(self):
-        self.firecrawl = get_firecrawl_config()
-        self.content_processor = ContentProcessor()
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: Shared HTTP client for extraction and LLM requests; the
+                caller owns it, so this handler gets its own extractor and
+                processor bound to it instead of the process-wide singletons
+        """
+        if http_client is None:
+            self.firecrawl = get_firecrawl_config()
+            self.content_processor = get_content_processor()
+        else:
+            self.firecrawl = FirecrawlConfig(http_client)
+            self.content_processor = ContentProcessor(http_client)
         self.handlers: Dict[str, Callable] = {
             "extract_and_prepare": self.handle_extract_and_prepare
         }
+        
+        # Prepared results per URL, reused for result_ttl seconds
+        self.result_ttl = 600
+        self._result_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._result_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._result_lock_users: Dict[str, int] = defaultdict(int)
+        
+        # Streamed text is batched into one event per this many characters or seconds
+        self.delta_flush_chars = 512
+        self.delta_flush_seconds = 0.1
     
-    async def handle_message(self, message: str) -> str:
+    async def handle_message(
+        self,
+        message: str,
+        next_seq: Optional[Callable[[], int]] = None,
+        emit: Optional[EventCallback] = None
+    ) -> str:
         """
         Handle incoming AG-UI protocol message.
         
         Args:
             message: JSON string containing the AG-UI message
+            next_seq: Optional source of frame sequence numbers for the response
+            emit: Optional callback for TEXT_MESSAGE_CONTENT events sent while
+                the response is being prepared
             
         Returns:
             JSON string containing the response
         """
         try:
-            # Parse message
-            msg_data = json.loads(message)
-            msg = AGUIMessage(**msg_data)
+            # Parse and validate message in one pass
+            msg = msgspec.json.decode(message, type=AGUIMessage)
             
             # Route to appropriate handler
             if msg.action in self.handlers:
-                result = await self.handlers[msg.action](msg.data)
+                on_delta = None
+                flush_timer: Optional[asyncio.Task] = None
+                if emit is not None:
+                    # Token deltas are tiny; batch them so each event carries a
+                    # useful amount of text, and flush on a timer so the tail of
+                    # a stream doesn't wait for the next delta
+                    pending = []
+                    pending_chars = 0
+                    
+                    async def flush():
+                        nonlocal pending_chars, flush_timer
+                        if flush_timer is not None and flush_timer is not asyncio.current_task():
+                            flush_timer.cancel()
+                        flush_timer = None
+                        if pending:
+                            delta = ''.join(pending)
+                            pending.clear()
+                            pending_chars = 0
+                            await emit({
+                                "type": "TEXT_MESSAGE_CONTENT",
+                                "action": msg.action,
+                                "id": msg.id,
+                                "delta": delta
+                            })
+                    
+                    async def flush_later():
+                        await asyncio.sleep(self.delta_flush_seconds)
+                        await flush()
+                    
+                    async def on_delta(delta: str):
+                        nonlocal pending_chars, flush_timer
+                        pending.append(delta)
+                        pending_chars += len(delta)
+                        if pending_chars >= self.delta_flush_chars:
+                            await flush()
+                        elif flush_timer is None:
+                            flush_timer = asyncio.create_task(flush_later())
+                
+                try:
+                    result = await self.handlers[msg.action](msg.data, on_delta=on_delta)
+                    if on_delta is not None:
+                        await flush()
+                finally:
+                    if flush_timer is not None:
+                        flush_timer.cancel()
                 response = {
                     "type": "response",
                     "action": msg.action,
@@ -72,29 +145,79 @@ class AGUIHandler:
                     "error": f"Unknown action: {msg.action}"
                 }
             
-            return json.dumps(response)
-            
         except Exception as e:
             logger.error(f"Error handling message: {str(e)}")
-            return json.dumps({
+            response = {
                 "type": "error",
                 "success": False,
                 "error": str(e)
-            })
+            }
+        
+        if next_seq is not None:
+            response["seq"] = next_seq()
+        
+        # The frontend parses text frames, so hand back str rather than bytes
+        return msgspec.json.encode(response).decode()
     
-    async def handle_extract_and_prepare(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract URL content and prepare it for speed reading in one step."""
+    async def handle_extract_and_prepare(
+        self,
+        data: Dict[str, Any],
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract URL content and prepare it for speed reading in one step.
+        
+        Args:
+            data: Request data containing the URL
+            on_delta: Optional callback receiving cleaned text as the LLM generates it
+            
+        Returns:
+            Dictionary with the cleaned content ready for the reader
+        """
         url = data.get("url")
         if not url:
             raise ValueError("URL is required")
         
+        # Concurrent requests for the same URL wait for one shared extraction
+        key = url.strip()
+        self._result_lock_users[key] += 1
+        try:
+            async with self._result_locks[key]:
+                cached = self._result_cache.get(key)
+                if cached and time.monotonic() - cached[0] < self.result_ttl:
+                    logger.info(f"Using cached result for URL: {url}")
+                    return cached[1]
+                
+                result = await self._extract_and_prepare(url, on_delta)
+                # Partially cleaned results are worth another try on the next request
+                if result["success"] and not result.get("failed_chunks"):
+                    self._cache_result(key, result)
+        finally:
+            self._result_lock_users[key] -= 1
+            if not self._result_lock_users[key]:
+                del self._result_lock_users[key]
+                # Cached URLs keep their lock until the entry expires
+                if key not in self._result_cache:
+                    self._result_locks.pop(key, None)
+        
+        return result
+    
+    def _cache_result(self, key: str, result: Dict[str, Any]):
+        """Store a prepared result and evict expired entries."""
+        now = time.monotonic()
+        expired = [k for k, (stored, _) in self._result_cache.items() if now - stored >= self.result_ttl]
+        for k in expired:
+            del self._result_cache[k]
+            if k not in self._result_lock_users:
+                self._result_locks.pop(k, None)
+        self._result_cache[key] = (now, result)
+    
+    async def _extract_and_prepare(self, url: str, on_delta: Optional[DeltaCallback] = None) -> Dict[str, Any]:
+        """Run extraction and LLM cleaning for a URL."""
         logger.info(f"Starting extraction for URL: {url}")
         
         # Step 1: Extract content using Firecrawl
-        extraction = await asyncio.to_thread(
-            self.firecrawl.extract_content,
-            url
-        )
+        extraction = await self.firecrawl.extract_content(url)
         
         if not extraction["success"]:
             logger.error(f"Firecrawl extraction failed: {extraction.get('error')}")
@@ -102,20 +225,26 @@ class AGUIHandler:
         
         logger.info(f"Firecrawl extracted {extraction['word_count']} words")
         
-        # Step 2: Clean content using LLM
+        # Step 2: Clean content using LLM (short, clean content skips the LLM
+        # inside process_for_reading, after link removal)
         processed = await self.content_processor.process_for_reading(
-            extraction["content"]
+            extraction["content"],
+            on_delta=on_delta
         )
         
-        if not processed["success"]:
+        failed_chunks = processed.get("failed_chunks", [])
+        if not processed["success"] and not failed_chunks:
             logger.warning("LLM cleaning failed, using original content")
             cleaned_content = extraction["content"]
             word_count = extraction["word_count"]
             chunks_processed = 0
         else:
+            # Chunks that failed cleaning keep their original text
             cleaned_content = processed["cleaned_content"]
             word_count = processed["word_count"]
             chunks_processed = processed.get("chunks_processed", 1)
+            if failed_chunks:
+                logger.warning(f"LLM cleaning failed for chunks {failed_chunks}, kept their original text")
             logger.info(f"LLM cleaned content to {word_count} words using {chunks_processed} chunks")
         
         # Step 3: Return cleaned content for speed reading
@@ -125,6 +254,7 @@ class AGUIHandler:
             "content": cleaned_content,  # This is what goes to the reader
             "word_count": word_count,
             "chunks_processed": chunks_processed,
+            "failed_chunks": failed_chunks,
             "estimated_reading_time": round(word_count / 200, 1),
             "success": True
         }
@@ -155,63 +285,4 @@ class AGUIWebSocketHandler:
             await asyncio.gather(
                 *[ws.send(message) for ws in self.connections],
                 return_exceptions=True
-            )
-
-
-# FastAPI integration
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.middleware.cors import CORSMiddleware
-
-app = FastAPI(title="Speed Read URL Extractor")
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Initialize handler
-agui_handler = AGUIHandler()
-
-
-@app.websocket("/ws/agui")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for AG-UI protocol."""
-    await websocket.accept()
-    try:
-        while True:
-            message = await websocket.receive_text()
-            response = await agui_handler.handle_message(message)
-            await websocket.send_text(response)
-    except WebSocketDisconnect:
-        logger.info("WebSocket disconnected")
-    except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
-        await websocket.close()
-
-
-@app.post("/api/extract")
-async def extract_url(request: Dict[str, Any]):
-    """REST endpoint for URL extraction."""
-    try:
-        result = await agui_handler.handle_extract_and_prepare(request)
-        return result
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
-
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "service": "speed-read-url-extractor"}
-
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+            )
\ No newline at end of file
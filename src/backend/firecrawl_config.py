@@ -2,52 +2,157 @@
 Firecrawl configuration and document extraction utilities.
 """
 import os
+import re
+import asyncio
+from collections import OrderedDict
 from typing import Optional, Dict, Any, List
-from firecrawl import FirecrawlApp
 from dotenv import load_dotenv
 import logging
 import httpx
-from bs4 import BeautifulSoup
-import html2text
+from selectolax.lexbor import LexborHTMLParser
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Once </main> has arrived the main content is complete; the rest is page chrome
+MAIN_CLOSE_TAG = re.compile(rb'</main\s*>', re.IGNORECASE)
+
+# Semantic main content containers, tried one at a time in priority order
+MAIN_CONTENT_SELECTORS = ('main', 'article', '[role="main"]')
+
+# Weaker class/id guesses, combined into one query used only when no
+# semantic container exists
+FALLBACK_CONTENT_SELECTOR = ', '.join([
+    '.main-content',
+    '#main-content',
+    '.content',
+    '#content',
+    '.post-content',
+    '.entry-content',
+    '.article-body'
+])
+
+# Elements whose text forms its own paragraph; inline text inside them is joined as-is
+BLOCK_TAGS = frozenset([
+    'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'blockquote', 'pre',
+    'div', 'section', 'article', 'main', 'td', 'th', 'dd', 'dt', 'figcaption'
+])
+
+# Elements that never hold readable content
+UNWANTED_TAG_SELECTOR = 'script, style, nav, footer, header, aside, noscript'
+
+FIRECRAWL_SCRAPE_URL = "https://api.firecrawl.dev/v1/scrape"
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def _block_text(root) -> str:
+    """
+    Extract the text under a node with one paragraph per block element.
+    
+    Text nodes are grouped by their nearest block ancestor, so links and
+    emphasis stay inside their sentence instead of becoming paragraphs. A
+    <br> ends a line, and an empty line (<br><br>) starts a new paragraph.
+    
+    Args:
+        root: Parsed lexbor node to extract text from
+        
+    Returns:
+        Paragraphs separated by blank lines
+    """
+    paragraphs = []
+    lines: List[str] = []
+    parts: List[str] = []
+    current_block = None
+    preformatted = False
+    
+    def flush():
+        lines.append(''.join(parts))
+        parts.clear()
+        if preformatted:
+            text = '\n'.join(lines).strip()
+            if text:
+                paragraphs.append(text)
+        else:
+            # Collapse source whitespace within each line the way a browser renders it
+            kept = []
+            for line in lines:
+                line = ' '.join(line.split())
+                if line:
+                    kept.append(line)
+                elif kept:
+                    paragraphs.append('\n'.join(kept))
+                    kept = []
+            if kept:
+                paragraphs.append('\n'.join(kept))
+        lines.clear()
+    
+    for node in root.traverse(include_text=True):
+        if node.tag != '-text' and node.tag != 'br':
+            continue
+        block = node.parent
+        while block is not None and block.tag not in BLOCK_TAGS and block.mem_id != root.mem_id:
+            block = block.parent
+        block_id = block.mem_id if block is not None else None
+        if block_id != current_block:
+            flush()
+            current_block = block_id
+            preformatted = block is not None and block.tag == 'pre'
+        if node.tag == 'br':
+            lines.append(''.join(parts))
+            parts.clear()
+        else:
+            parts.append(node.text_content or '')
+    flush()
+    
+    return '\n\n'.join(paragraphs)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by extraction and API calls."""
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100)
+    )
+
 
 class FirecrawlConfig:
     """Configuration for Firecrawl document loader."""
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            client: Shared HTTP client; a private pooled client is created if omitted
+        """
         self.api_key = os.getenv("FIRECRAWL_API_KEY")
         if not self.api_key:
             raise ValueError("FIRECRAWL_API_KEY not found in environment variables")
         
-        # Initialize Firecrawl app
-        self.app = FirecrawlApp(api_key=self.api_key)
-        
         # Default scraping parameters
         self.default_params = {
+            "formats": ["markdown"],     # Only markdown; no raw HTML or screenshots
             "onlyMainContent": True,     # Extract only main content
-            "includeHtml": False,        # Don't include raw HTML
-            "screenshot": False,         # Don't take screenshots
             "waitFor": 2000,            # Wait 2 seconds for JS to load
-            "removeTags": ["script", "style", "nav", "footer", "header"],  # Remove unwanted tags
+            "excludeTags": ["script", "style", "nav", "footer", "header"],  # Remove unwanted tags
         }
         
-        # Initialize HTML to text converter
-        self.html_converter = html2text.HTML2Text()
-        self.html_converter.ignore_links = False
-        self.html_converter.ignore_images = True
-        self.html_converter.ignore_emphasis = False
-        self.html_converter.body_width = 0  # Don't wrap text
+        # Shared HTTP client so connections are pooled across extractions
+        self.client = client or create_http_client()
+        
+        # LRU cache of direct HTML extractions, revalidated with conditional requests
+        self.cache_size = 128
+        self._cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        
+        # Stop reading pages beyond this size
+        self.max_page_bytes = 10 * 1024 * 1024
     
-    def extract_content(self, url: str, **kwargs) -> Dict[str, Any]:
+    async def extract_content(self, url: str, **kwargs) -> Dict[str, Any]:
         """
-        Extract content from a URL using BeautifulSoup as default, with Firecrawl as fallback.
+        Extract content from a URL by fetching and parsing the HTML directly (lexbor), with Firecrawl as fallback.
         
         Args:
             url: The URL to extract content from
@@ -58,17 +163,17 @@ class FirecrawlConfig:
         """
         logger.info(f"Extracting content from URL: {url}")
         
-        # Try BeautifulSoup first (default)
-        result = self._beautifulsoup_extract(url)
+        # Try direct HTML extraction first (default)
+        result = await self._beautifulsoup_extract(url)
         
         if not result["success"]:
             # Try Firecrawl as fallback
-            logger.warning(f"BeautifulSoup failed for {url}, trying Firecrawl fallback")
-            result = self._firecrawl_fallback(url, **kwargs)
+            logger.warning(f"Direct HTML extraction failed for {url}, trying Firecrawl fallback")
+            result = await self._firecrawl_fallback(url, **kwargs)
         
         return result
     
-    def _firecrawl_fallback(self, url: str, **kwargs) -> Dict[str, Any]:
+    async def _firecrawl_fallback(self, url: str, **kwargs) -> Dict[str, Any]:
         """
         Fallback method to extract content using Firecrawl.
         
@@ -87,14 +192,21 @@ class FirecrawlConfig:
             if kwargs:
                 params.update(kwargs)
             
-            # Scrape the URL
-            result = self.app.scrape_url(url, params=params)
+            # Scrape the URL through the REST API on the shared client
+            response = await self.client.post(
+                FIRECRAWL_SCRAPE_URL,
+                json={"url": url, **params},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=60.0
+            )
+            response.raise_for_status()
+            result = response.json().get('data') or {}
             
-            if not result or 'content' not in result:
+            if 'markdown' not in result:
                 raise ValueError("No content extracted from URL")
             
             # Extract the content
-            content = result.get('content', '')
+            content = result.get('markdown', '')
             metadata = result.get('metadata', {})
             
             # Calculate reading statistics
@@ -126,12 +238,12 @@ class FirecrawlConfig:
                 "estimated_reading_time": 0,
                 "metadata": {},
                 "success": False,
-                "error": f"Both BeautifulSoup and Firecrawl failed: {str(e)}"
+                "error": f"Both direct HTML extraction and Firecrawl failed: {str(e)}"
             }
     
-    def _beautifulsoup_extract(self, url: str) -> Dict[str, Any]:
+    async def _beautifulsoup_extract(self, url: str) -> Dict[str, Any]:
         """
-        Primary method to extract content using BeautifulSoup.
+        Primary method to extract content by fetching the page and parsing it with lexbor.
         
         Args:
             url: The URL to extract content from
@@ -140,81 +252,66 @@ class FirecrawlConfig:
             Dictionary containing extracted content and metadata
         """
         try:
-            logger.info(f"Using BeautifulSoup to extract content from: {url}")
+            logger.info(f"Parsing HTML with lexbor to extract content from: {url}")
             
             # Fetch the page content
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+            headers = {'User-Agent': USER_AGENT}
             
-            response = httpx.get(url, headers=headers, follow_redirects=True, timeout=30.0)
-            response.raise_for_status()
+            # Revalidate a cached extraction instead of refetching and reparsing
+            cached = self._cache.get(url)
+            if cached:
+                if cached["etag"]:
+                    headers['If-None-Match'] = cached["etag"]
+                if cached["last_modified"]:
+                    headers['If-Modified-Since'] = cached["last_modified"]
             
-            # Parse with BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Stream the body so reading can stop as soon as the main content is complete
+            async with self.client.stream('GET', url, headers=headers) as response:
+                if cached and response.status_code == 304:
+                    logger.info(f"Content not modified, using cached extraction for: {url}")
+                    self._cache.move_to_end(url)
+                    return dict(cached["result"])
+                
+                response.raise_for_status()
+                html = await self._read_html(response)
+            
+            # Parse with lexbor (C-backed, much faster than html.parser)
+            tree = LexborHTMLParser(html)
             
             # Extract title
-            title = soup.find('title')
-            title_text = title.string if title else "Untitled"
+            title = tree.css_first('title')
+            title_text = title.text(strip=True) if title else "Untitled"
             
             # Remove unwanted elements
-            for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript']):
+            for tag in tree.css(UNWANTED_TAG_SELECTOR):
                 tag.decompose()
             
-            # Try to find main content areas
+            # Prefer semantic containers in order, then the weak guesses, then body
             main_content = None
-            
-            # Look for common main content selectors
-            selectors = [
-                'main',
-                'article',
-                '[role="main"]',
-                '.main-content',
-                '#main-content',
-                '.content',
-                '#content',
-                '.post-content',
-                '.entry-content',
-                '.article-body'
-            ]
-            
-            for selector in selectors:
-                main_content = soup.select_one(selector)
-                if main_content:
+            for selector in MAIN_CONTENT_SELECTORS:
+                main_content = tree.css_first(selector)
+                if main_content is not None:
                     break
-            
-            # If no main content found, use body
-            if not main_content:
-                main_content = soup.find('body')
+            if main_content is None:
+                main_content = tree.css_first(FALLBACK_CONTENT_SELECTOR) or tree.body
             
             # Convert to text
-            if main_content:
-                # Convert to markdown-like text
-                text_content = self.html_converter.handle(str(main_content))
-                
-                # Clean up excessive whitespace
-                lines = text_content.split('\n')
-                cleaned_lines = []
-                for line in lines:
-                    stripped = line.strip()
-                    if stripped:
-                        cleaned_lines.append(stripped)
-                
-                content = '\n\n'.join(cleaned_lines)
+            if main_content is not None:
+                content = _block_text(main_content)
             else:
                 content = "Could not extract content from the page."
             
             # Extract metadata
             description = ""
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                description = meta_desc.get('content', '')
+            meta_desc = tree.css_first('meta[name="description"]')
+            if meta_desc is not None:
+                description = meta_desc.attributes.get('content') or ''
             
             # Calculate reading statistics
             word_count = len(content.split())
             reading_time_minutes = word_count / 200
             
-            return {
+            result = {
                 "url": url,
                 "title": title_text,
                 "description": description,
@@ -228,8 +325,11 @@ class FirecrawlConfig:
                 "error": None
             }
             
+            self._cache_extraction(url, response, result)
+            return result
+            
         except Exception as e:
-            logger.error(f"BeautifulSoup extraction failed for {url}: {str(e)}")
+            logger.error(f"Direct HTML extraction failed for {url}: {str(e)}")
             return {
                 "url": url,
                 "title": "Error",
@@ -239,25 +339,84 @@ class FirecrawlConfig:
                 "estimated_reading_time": 0,
                 "metadata": {},
                 "success": False,
-                "error": f"BeautifulSoup extraction failed: {str(e)}"
+                "error": f"Direct HTML extraction failed: {str(e)}"
             }
     
-    def extract_multiple_urls(self, urls: List[str], **kwargs) -> List[Dict[str, Any]]:
-        """Extract content from multiple URLs."""
-        results = []
-        for url in urls:
-            result = self.extract_content(url, **kwargs)
-            results.append(result)
-        return results
+    async def _read_html(self, response: httpx.Response) -> str:
+        """
+        Read a streamed HTML response, stopping early once </main> has arrived.
+        
+        Args:
+            response: The streamed HTTP response
+            
+        Returns:
+            The decoded HTML read so far
+        """
+        body = bytearray()
+        async for chunk in response.aiter_bytes(65536):
+            # Rescan a few bytes before the new chunk in case the tag straddles it
+            scan_from = max(0, len(body) - 16)
+            body += chunk
+            if MAIN_CLOSE_TAG.search(body, scan_from):
+                break
+            if len(body) >= self.max_page_bytes:
+                logger.warning(f"Page exceeds {self.max_page_bytes} bytes, truncating: {response.url}")
+                break
+        
+        return body.decode(response.encoding or 'utf-8', errors='replace')
+    
+    def _cache_extraction(self, url: str, response: httpx.Response, result: Dict[str, Any]):
+        """
+        Remember an extraction if the response carries validators for revalidation.
+        
+        Args:
+            url: The URL that was extracted
+            response: The HTTP response the extraction was parsed from
+            result: The extraction result to cache
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            self._cache.pop(url, None)
+            return
+        
+        self._cache[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "result": dict(result)
+        }
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    async def extract_multiple_urls(self, urls: List[str], concurrency: int = 10, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Extract content from multiple URLs concurrently.
+        
+        Args:
+            urls: The URLs to extract content from
+            concurrency: Maximum number of extractions in flight at once
+            **kwargs: Additional parameters to pass to extraction
+            
+        Returns:
+            List of extraction results in the same order as urls
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def extract_one(url: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.extract_content(url, **kwargs)
+        
+        return await asyncio.gather(*(extract_one(url) for url in urls))
 
 
 # Singleton instance
 _firecrawl_config = None
 
 
-def get_firecrawl_config() -> FirecrawlConfig:
-    """Get or create the Firecrawl configuration singleton."""
+def get_firecrawl_config(client: Optional[httpx.AsyncClient] = None) -> FirecrawlConfig:
+    """Get or create the Firecrawl configuration singleton, rebinding it to a new client."""
     global _firecrawl_config
-    if _firecrawl_config is None:
-        _firecrawl_config = FirecrawlConfig()
+    if _firecrawl_config is None or (client is not None and _firecrawl_config.client is not client):
+        _firecrawl_config = FirecrawlConfig(client)
     return _firecrawl_config
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Response cache for LLM content cleaning.
+"""
+import os
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional, Protocol, List
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Cleaned chunks are deterministic (temperature 0), so they can live for a while
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class CacheBackend(Protocol):
+    """Async key/value store for cleaned chunks."""
+    
+    async def get(self, key: str) -> Optional[str]:
+        ...
+    
+    async def set(self, key: str, value: str, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+        ...
+
+
+def make_cache_key(model: str, prompt_version: str, chunk: str) -> str:
+    """Build a cache key from everything that determines the LLM output."""
+    payload = json.dumps({"m": model, "v": prompt_version, "c": chunk}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryCache:
+    """Bounded in-process LRU cache."""
+    
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, str] = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: str, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RedisCache:
+    """Redis-backed cache shared across workers. Errors are logged, never raised."""
+    
+    def __init__(self, url: str, prefix: str = "speed-read:llm:"):
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+    
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache get failed: {str(e)}")
+            return None
+        return value.decode() if value is not None else None
+    
+    async def set(self, key: str, value: str, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+        try:
+            await self.client.setex(self.prefix + key, ttl, value)
+        except Exception as e:
+            logger.warning(f"Redis cache set failed: {str(e)}")
+
+
+class TieredCache:
+    """Check backends in order, backfilling faster tiers on a hit in a slower one."""
+    
+    def __init__(self, backends: List[CacheBackend]):
+        self.backends = backends
+    
+    async def get(self, key: str) -> Optional[str]:
+        for i, backend in enumerate(self.backends):
+            value = await backend.get(key)
+            if value is not None:
+                for faster in self.backends[:i]:
+                    await faster.set(key, value)
+                return value
+        return None
+    
+    async def set(self, key: str, value: str, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+        for backend in self.backends:
+            await backend.set(key, value, ttl)
+
+
+def create_llm_cache() -> CacheBackend:
+    """Create the in-memory cache, backed by Redis when LLM_CACHE_REDIS_URL is set."""
+    memory = MemoryCache(max_size=int(os.getenv("LLM_CACHE_SIZE", "1024")))
+    redis_url = os.getenv("LLM_CACHE_REDIS_URL")
+    if not redis_url:
+        return memory
+    if redis is None:
+        logger.warning("LLM_CACHE_REDIS_URL is set but redis is not installed; using in-memory cache only")
+        return memory
+    return TieredCache([memory, RedisCache(redis_url)])
@@ -2,35 +2,88 @@
 LLM prompts for cleaning Firecrawl content.
 """
 import os
-from typing import Dict, Any, Optional, List, Tuple
-from groq import Groq
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+from groq import AsyncGroq, APIConnectionError, APIStatusError, RateLimitError
 from dotenv import load_dotenv
 import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor
-import math
+import random
+import re
+import time
+import httpx
+try:
+    from .llm_cache import create_llm_cache, make_cache_key
+except ImportError:
+    # When running as a script
+    from llm_cache import create_llm_cache, make_cache_key
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Async callback receiving cleaned text as the LLM generates it
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+# Bump whenever the cleaning prompt changes so cached responses are not reused
+PROMPT_VERSION = "v2"
+
+# Deterministic link removal, done before the LLM sees the text
+# Links and images reduce to their text; one level of balanced parentheses is
+# allowed in the target, as in Wikipedia's /wiki/Foo_(bar) URLs
+_MD_LINK = re.compile(r'!?\[([^\]\n]*)\]\((?:[^()\n]|\([^()\n]*\))*\)')
+_HTML_A = re.compile(r'<a\s+[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+# A URL never ends in sentence punctuation or an unbalanced closing bracket, so
+# leave those in place
+_BARE_URL = re.compile(
+    r'(?:https?://|www\.)(?:[^\s<>()]|\([^\s<>()]*\))*(?:[^\s<>().,;:!?\]\'"]|\([^\s<>()]*\))'
+)
+
+# Text that signals page chrome the LLM still needs to remove
+_CHROME_MARKERS = re.compile(
+    "|".join(re.escape(marker) for marker in ("Subscribe", "Advertisement", "cookie", "Privacy Policy")),
+    re.IGNORECASE
+)
+
 
 class ContentProcessor:
     """Clean extracted content from Firecrawl using Groq's Llama 4 Scout 17B."""
     
-    def __init__(self):
-        """Initialize content processor with Groq client."""
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize content processor with Groq client.
+        
+        Args:
+            http_client: Shared HTTP client for Groq requests; a pooled one is created if omitted
+        """
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
         
-        self.client = Groq(api_key=api_key)
+        # Long completions need more than the shared client's 30 s default; pass
+        # it explicitly, since the SDK otherwise adopts the http_client's timeout
+        timeout = httpx.Timeout(60.0, connect=10.0)
+        if http_client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+                timeout=timeout
+            )
+        self.http_client = http_client
+        # Retries are handled in _process_chunk with rate-limit-aware backoff
+        self.client = AsyncGroq(api_key=api_key, http_client=http_client, timeout=timeout, max_retries=0)
         self.model = "meta-llama/llama-4-scout-17b-16e-instruct"
         self.chunk_size = 4000  # Words per chunk
         self.max_workers = 50    # Maximum parallel LLM calls
+        self.max_attempts = 5    # Attempts per chunk on rate limits and server errors
+        self.chunk_retry_budget = 120  # Seconds after which a chunk stops retrying
+        self.max_output_tokens = 8000  # Most tokens one chunk may generate
+        self.failed_chunk_passes = 2  # Extra passes over chunks that still failed
+        # Short content with no chrome markers or nav-style "a | b | c" runs skips the LLM
+        self.direct_max_words = 500
+        self.direct_max_pipe_ratio = 0.02
+        self._sem = asyncio.Semaphore(self.max_workers)
+        self.cache = create_llm_cache()
+        self.cache_stats = {"hits": 0, "misses": 0}
         self._setup_prompt()
     
     def _setup_prompt(self):
@@ -50,23 +103,10 @@ IMPORTANT RULES:
    - Image captions (unless integral to understanding)
    - Timestamps, metadata, tags
    - Any UI elements or website chrome
-3. REMOVE ALL INLINE LINKS AND URLs from the text:
-   - Remove markdown links like [text](url) - keep only the text part
-   - Remove HTML links like <a href="url">text</a> - keep only the text part
-   - Remove any standalone URLs (http://, https://, www.) from sentences
-   - If a sentence says "Visit https://example.com for more info", change it to "Visit the website for more info"
-   - The goal is clean, uninterrupted reading flow without any URLs
-4. PRESERVE the natural reading flow of the main content
-5. DO NOT add any commentary, summaries, or explanations
-6. DO NOT rewrite or paraphrase - keep the original text intact
-7. Output ONLY the cleaned main content, nothing else
-
-Examples of link removal:
-BEFORE: "After the [fall of France](url) in June 1940, the war continued mainly between Germany and the [British Empire](url)."
-AFTER: "After the fall of France in June 1940, the war continued mainly between Germany and the British Empire."
-
-BEFORE: "Visit https://example.com for more info or check out <a href='test.com'>this resource</a>."
-AFTER: "Visit the website for more info or check out this resource."
+3. PRESERVE the natural reading flow of the main content
+4. DO NOT add any commentary, summaries, or explanations
+5. DO NOT rewrite or paraphrase - keep the original text intact
+6. Output ONLY the cleaned main content, nothing else
 
 Here is the content to clean:
 <content>
@@ -75,139 +115,378 @@ Here is the content to clean:
 
 </content>
 CLEANED CONTENT:"""
+        
+        # The template is fixed, so split it once; the chunk always comes after
+        # the instructions, which keeps the prompt prefix identical across calls
+        self._prompt_prefix, self._prompt_suffix = self.cleaning_prompt.split("{content}")
+    
+    def _pre_clean(self, text: str) -> str:
+        """
+        Strip links and URLs so the LLM only handles judgement-call removals.
+        
+        Args:
+            text: The text to clean
+            
+        Returns:
+            Text with markdown/HTML links reduced to their text and bare URLs replaced
+        """
+        text = _MD_LINK.sub(r'\1', text)
+        text = _HTML_A.sub(r'\1', text)
+        return _BARE_URL.sub('the website', text)
+    
+    def _is_short_and_clean(self, text: str) -> bool:
+        """
+        Check whether pre-cleaned text can go to the reader without the LLM.
+        
+        Args:
+            text: Pre-cleaned text
+            
+        Returns:
+            True if the text is short and has no chrome markers or nav runs
+        """
+        # Cheap length guard so long articles never get counted on the event loop
+        if len(text) > self.direct_max_words * 20:
+            return False
+        word_count = len(text.split())
+        return (
+            word_count < self.direct_max_words
+            and text.count("|") / max(word_count, 1) < self.direct_max_pipe_ratio
+            and not _CHROME_MARKERS.search(text)
+        )
     
     def _chunk_text(self, text: str) -> List[str]:
         """
         Split text into chunks of approximately chunk_size words.
         
+        Chunks are slices of the original text, cut at a paragraph break or
+        sentence end near each target size so sentences are rarely split.
+        
         Args:
             text: The text to chunk
             
         Returns:
             List of text chunks
         """
-        words = text.split()
-        total_words = len(words)
-        
-        if total_words <= self.chunk_size:
+        window = self.chunk_size * 5  # ~5 characters per word
+        if len(text) <= window:
             return [text]
         
         chunks = []
-        num_chunks = math.ceil(total_words / self.chunk_size)
-        
-        for i in range(num_chunks):
-            start_idx = i * self.chunk_size
-            end_idx = min((i + 1) * self.chunk_size, total_words)
-            chunk_words = words[start_idx:end_idx]
-            chunks.append(' '.join(chunk_words))
+        pos = 0
+        while pos < len(text):
+            end = min(pos + window, len(text))
+            if end < len(text):
+                # Prefer a paragraph break, then a sentence end, then any space,
+                # in the back half of the window so chunks stay close to size
+                floor = pos + window // 2
+                for separator in ("\n\n", ". ", " "):
+                    cut = text.rfind(separator, floor, end)
+                    if cut != -1:
+                        end = cut + len(separator)
+                        break
+            chunks.append(text[pos:end])
+            pos = end
         
-        logger.info(f"Split {total_words} words into {len(chunks)} chunks")
+        logger.info(f"Split {len(text)} characters into {len(chunks)} chunks")
         return chunks
     
-    def _process_chunk(self, chunk: str, chunk_index: int) -> Tuple[int, str]:
+    async def _process_chunk(
+        self,
+        chunk: str,
+        chunk_index: int,
+        on_delta: Optional[DeltaCallback] = None,
+        attempts: Optional[int] = None
+    ) -> Tuple[int, str, bool, bool]:
         """
         Process a single chunk through the LLM.
         
         Args:
             chunk: The text chunk to process
             chunk_index: Index of this chunk for ordering
+            on_delta: If given, stream the completion and pass each text delta to it
+            attempts: Attempts on rate limits and server errors (default max_attempts)
             
         Returns:
-            Tuple of (chunk_index, cleaned_text)
+            Tuple of (chunk_index, cleaned_text, ok, retryable); on failure the
+            text is the original chunk, ok is False and retryable says whether
+            another attempt could succeed
         """
-        try:
-            # Format the prompt with content
-            prompt = self.cleaning_prompt.format(content=chunk)
-            
-            # Call Groq API
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0,
-                max_tokens=8000,
-                top_p=1,
-                stream=False
-            )
-            
-            # Extract cleaned content
-            cleaned_content = completion.choices[0].message.content.strip()
-            
-            logger.info(f"Processed chunk {chunk_index + 1}: {len(chunk.split())} words -> {len(cleaned_content.split())} words")
+        # Build the request messages once; retries reuse them as-is
+        messages = [{"role": "user", "content": self._prompt_prefix + chunk + self._prompt_suffix}]
+        
+        # Output is a subset of the input, so cap generation near the input size
+        # (~4 characters per token, plus headroom); output that hits the cap is
+        # truncated, so it is retried at the full cap or reported as failed
+        max_tokens = min(self.max_output_tokens, int(len(chunk) / 4 * 1.2) + 64)
+        
+        attempts = attempts or self.max_attempts
+        
+        async with self._sem:
+            deadline = time.monotonic() + self.chunk_retry_budget
+            attempt = 0
+            while True:
+                streamed = False
+                try:
+                    # Call Groq API
+                    completion = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0,
+                        max_tokens=max_tokens,
+                        top_p=1,
+                        stream=on_delta is not None
+                    )
+                    
+                    if on_delta is None:
+                        cleaned_content = completion.choices[0].message.content
+                        finish_reason = completion.choices[0].finish_reason
+                        if cleaned_content is None:
+                            raise ValueError("Completion returned no content")
+                    else:
+                        parts = []
+                        finish_reason = None
+                        async for part in completion:
+                            if not part.choices:
+                                continue
+                            finish_reason = part.choices[0].finish_reason or finish_reason
+                            delta = part.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                streamed = True
+                                await on_delta(delta)
+                        cleaned_content = ''.join(parts)
+                    
+                    if finish_reason == "length":
+                        # Dense text (CJK, Cyrillic, numbers) needs more tokens per
+                        # character than estimated; never pass a cut-off cleaning on
+                        if streamed or max_tokens >= self.max_output_tokens:
+                            logger.error(f"Chunk {chunk_index + 1} output was truncated at {max_tokens} tokens")
+                            # A later pass can still use the full cap if this one didn't
+                            return (chunk_index, chunk, False, max_tokens < self.max_output_tokens)
+                        logger.warning(f"Chunk {chunk_index + 1} output hit {max_tokens} tokens, retrying with {self.max_output_tokens}")
+                        # Raising the cap happens at most once and isn't counted as an attempt
+                        max_tokens = self.max_output_tokens
+                        continue
+                    break
+                except (RateLimitError, APIStatusError, APIConnectionError) as e:
+                    retryable = not isinstance(e, APIStatusError) or e.status_code == 429 or e.status_code >= 500
+                    # Text already streamed to the client can't be taken back
+                    if not retryable or streamed or attempt == attempts - 1:
+                        logger.error(f"Error processing chunk {chunk_index + 1}: {str(e)}")
+                        return (chunk_index, chunk, False, retryable)
+                    delay = min(30, 2 ** attempt) + random.random()
+                    if time.monotonic() + delay > deadline:
+                        # Don't hold a semaphore slot (and the URL's result lock) indefinitely
+                        logger.error(f"Chunk {chunk_index + 1} out of retry time after {attempt + 1} attempts: {str(e)}")
+                        return (chunk_index, chunk, False, False)
+                    logger.warning(f"Chunk {chunk_index + 1} attempt {attempt + 1} failed ({str(e)}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                except Exception as e:
+                    # Anything else (e.g. an APIError raised mid-stream, or an empty
+                    # completion) fails only this chunk
+                    logger.error(f"Error processing chunk {chunk_index + 1}: {str(e)}")
+                    return (chunk_index, chunk, False, True)
+        
+        # Extract cleaned content
+        cleaned_content = cleaned_content.strip()
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Processed chunk %d: %d words -> %d words",
+                        chunk_index + 1, len(chunk.split()), len(cleaned_content.split()))
+        
+        return (chunk_index, cleaned_content, True, True)
+    
+    async def _process_chunk_cached(
+        self,
+        chunk: str,
+        chunk_index: int,
+        on_delta: Optional[DeltaCallback] = None,
+        attempts: Optional[int] = None
+    ) -> Tuple[int, str, bool, bool]:
+        """
+        Process a chunk, reusing a cached response for identical input.
+        
+        Args:
+            chunk: The text chunk to process
+            chunk_index: Index of this chunk for ordering
+            on_delta: If given, receives the cleaned text as it is generated
+            attempts: Attempts on rate limits and server errors (default max_attempts)
             
-            return (chunk_index, cleaned_content)
+        Returns:
+            Tuple of (chunk_index, cleaned_text, ok, retryable)
+        """
+        key = make_cache_key(self.model, PROMPT_VERSION, chunk)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            self.cache_stats["hits"] += 1
+            if on_delta is not None:
+                await on_delta(cached)
+            return (chunk_index, cached, True, True)
+        
+        self.cache_stats["misses"] += 1
+        result = await self._process_chunk(chunk, chunk_index, on_delta, attempts)
+        if result[2]:
+            await self.cache.set(key, result[1])
+        return result
+    
+    async def _process_chunks_windowed(
+        self,
+        positions: Dict[str, List[int]],
+        total: int,
+        on_delta: Optional[DeltaCallback] = None,
+        attempts: Optional[int] = None
+    ) -> Tuple[List[str], List[int], List[int]]:
+        """
+        Clean chunks keeping at most max_workers requests in flight.
+        
+        The first chunk streams through on_delta as it is generated; each later
+        chunk is passed on whole once every chunk before it has finished. A
+        chunk that could not be cleaned is passed on as its original text.
+        
+        Args:
+            positions: Distinct chunk text mapped to the indices it appears at
+            total: Total number of chunks
+            on_delta: Optional callback receiving cleaned text in reading order
+            attempts: Attempts per chunk on rate limits and server errors
             
-        except Exception as e:
-            logger.error(f"Error processing chunk {chunk_index + 1}: {str(e)}")
-            # Return original chunk on error
-            return (chunk_index, chunk)
+        Returns:
+            Tuple of (cleaned chunks in original order, indices that failed,
+            the subset of those worth retrying)
+        """
+        pending = list(positions.items())
+        pending.reverse()  # pop() from the end in order of first appearance
+        cleaned_chunks: List[Optional[str]] = [None] * total
+        in_flight: Dict[asyncio.Task, List[int]] = {}
+        failed: List[int] = []
+        retryable: List[int] = []
+        next_index = 0
+        first_streamed = False
+        
+        async def stream_first(delta: str):
+            nonlocal first_streamed
+            first_streamed = True
+            await on_delta(delta)
+        
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < self.max_workers:
+                    chunk, indices = pending.pop()
+                    stream = stream_first if on_delta is not None and indices[0] == 0 else None
+                    task = asyncio.create_task(self._process_chunk_cached(chunk, indices[0], stream, attempts))
+                    in_flight[task] = indices
+                
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    indices = in_flight.pop(task)
+                    _, cleaned, ok, can_retry = task.result()
+                    for i in indices:
+                        cleaned_chunks[i] = cleaned
+                    if not ok:
+                        failed.extend(indices)
+                        if can_retry:
+                            retryable.extend(indices)
+                
+                # Hand on every chunk that is now complete in reading order
+                while next_index < total and cleaned_chunks[next_index] is not None:
+                    if on_delta is not None:
+                        if next_index > 0:
+                            await on_delta("\n\n" + cleaned_chunks[next_index])
+                        elif not first_streamed:
+                            # The first chunk failed before streaming anything
+                            await on_delta(cleaned_chunks[0])
+                    next_index += 1
+        finally:
+            for task in in_flight:
+                task.cancel()
+        
+        return cleaned_chunks, sorted(failed), sorted(retryable)
     
-    async def process_for_reading(self, content: str) -> Dict[str, Any]:
+    async def process_for_reading(self, content: str, on_delta: Optional[DeltaCallback] = None) -> Dict[str, Any]:
         """
         Clean content extracted by Firecrawl for speed reading.
         Handles large content by chunking and processing in parallel.
         
         Args:
             content: Raw content extracted from URL by Firecrawl
+            on_delta: If given, receives the cleaned text in reading order as it
+                is generated so reading can start before the rest is done
             
         Returns:
             Dictionary with cleaned content
         """
         try:
-            # Split content into chunks
-            chunks = self._chunk_text(content)
+            # Strip links, then split content into chunks; both are O(n) regex and
+            # string work, so run them off the event loop
+            text = await asyncio.to_thread(self._pre_clean, content)
+            
+            if self._is_short_and_clean(text):
+                word_count = len(text.split())
+                logger.info(f"Skipping LLM cleaning for short, clean content ({word_count} words)")
+                return {
+                    "cleaned_content": text,
+                    "word_count": word_count,
+                    "chunks_processed": 0,
+                    "success": True
+                }
+            
+            chunks = await asyncio.to_thread(self._chunk_text, text)
             
             if len(chunks) == 1:
-                # Single chunk - process normally
                 logger.info("Processing single chunk")
-                _, cleaned_content = await asyncio.to_thread(
-                    self._process_chunk, 
-                    chunks[0], 
-                    0
-                )
             else:
-                # Multiple chunks - process in parallel
                 logger.info(f"Processing {len(chunks)} chunks in parallel")
+            
+            # Clean each distinct chunk once and fan the result out to every
+            # position it appears in
+            positions: Dict[str, List[int]] = {}
+            for i, chunk in enumerate(chunks):
+                positions.setdefault(chunk, []).append(i)
+            if len(positions) < len(chunks):
+                logger.info(f"Skipping {len(chunks) - len(positions)} duplicate chunks")
+            
+            cleaned_chunks, failed, retryable = await self._process_chunks_windowed(positions, len(chunks), on_delta)
+            
+            # Give only the chunks that failed for transient reasons further
+            # single-attempt passes, keeping the rest; rejected requests (4xx)
+            # would fail again
+            permanent = sorted(set(failed) - set(retryable))
+            for attempt in range(self.failed_chunk_passes):
+                if not retryable:
+                    break
+                delay = min(30, 2 ** (attempt + 1)) + random.random()
+                logger.warning(f"Retrying {len(retryable)} failed chunks in {delay:.1f}s")
+                await asyncio.sleep(delay)
                 
-                # Use ThreadPoolExecutor for parallel processing
-                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
-                    # Submit all chunks for processing
-                    loop = asyncio.get_event_loop()
-                    tasks = []
-                    
-                    for i, chunk in enumerate(chunks):
-                        task = loop.run_in_executor(
-                            executor,
-                            self._process_chunk,
-                            chunk,
-                            i
-                        )
-                        tasks.append(task)
-                    
-                    # Wait for all chunks to be processed
-                    results = await asyncio.gather(*tasks)
-                    
-                    # Sort results by chunk index and combine
-                    sorted_results = sorted(results, key=lambda x: x[0])
-                    cleaned_chunks = [result[1] for result in sorted_results]
-                    
-                    # Combine chunks with proper spacing
-                    cleaned_content = '\n\n'.join(cleaned_chunks)
+                retry_positions: Dict[str, List[int]] = {}
+                for i in retryable:
+                    retry_positions.setdefault(chunks[i], []).append(i)
+                retried, still_failed, still_retryable = await self._process_chunks_windowed(
+                    retry_positions, len(chunks), attempts=1
+                )
+                for i in set(retryable) - set(still_failed):
+                    cleaned_chunks[i] = retried[i]
+                permanent = sorted(set(permanent) | (set(still_failed) - set(still_retryable)))
+                retryable = still_retryable
+            failed = sorted(set(permanent) | set(retryable))
+            
+            cleaned_content = '\n\n'.join(cleaned_chunks)
             
             # Calculate word count
             word_count = len(cleaned_content.split())
             
-            logger.info(f"Successfully cleaned content: {word_count} words from {len(content.split())} original words")
+            if failed:
+                logger.warning(f"Cleaned content with {len(failed)} of {len(chunks)} chunks left uncleaned: {word_count} words")
+            elif logger.isEnabledFor(logging.INFO):
+                logger.info("Successfully cleaned content: %d words from %d original words",
+                            word_count, len(content.split()))
             
             return {
                 "cleaned_content": cleaned_content,
                 "word_count": word_count,
                 "chunks_processed": len(chunks),
-                "success": True
+                "failed_chunks": failed,
+                "success": not failed
             }
             
         except Exception as e:
@@ -222,10 +501,24 @@ CLEANED CONTENT:"""
             }
     
 
+# Singleton instance
+_content_processor = None
+
+
+def get_content_processor(http_client: Optional[httpx.AsyncClient] = None) -> ContentProcessor:
+    """Get or create the content processor singleton, rebinding it to a new http_client."""
+    global _content_processor
+    if _content_processor is None or (http_client is not None and _content_processor.http_client is not http_client):
+        _content_processor = ContentProcessor(http_client)
+    return _content_processor
+
+
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     async def test():
-        processor = ContentProcessor()
+        processor = get_content_processor()
         
         test_content = """
         Home | About | Contact | Subscribe
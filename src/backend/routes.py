@@ -0,0 +1,72 @@
+"""
+FastAPI routes for the standalone URL extraction backend.
+"""
+import os
+from typing import Dict, Any
+import logging
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+try:
+    from .agui_integration import AGUIHandler
+except ImportError:
+    # When running as a script
+    from agui_integration import AGUIHandler
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Speed Read URL Extractor", default_response_class=ORJSONResponse)
+
+# Add CORS middleware; credentials are only allowed for explicit origins
+ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("ALLOWED_ORIGINS", "*").split(",") if origin.strip()]
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=ALLOWED_ORIGINS,
+    allow_credentials="*" not in ALLOWED_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
+)
+
+# Initialize handler
+agui_handler = AGUIHandler()
+
+
+@app.websocket("/ws/agui")
+async def websocket_endpoint(websocket: WebSocket):
+    """WebSocket endpoint for AG-UI protocol."""
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            response = await agui_handler.handle_message(message)
+            await websocket.send_text(response)
+    except WebSocketDisconnect:
+        logger.info("WebSocket disconnected")
+    except Exception as e:
+        logger.error(f"WebSocket error: {str(e)}")
+        await websocket.close()
+
+
+@app.post("/api/extract")
+async def extract_url(request: Dict[str, Any]):
+    """REST endpoint for URL extraction."""
+    try:
+        result = await agui_handler.handle_extract_and_prepare(request)
+        return result
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint."""
+    return {"status": "healthy", "service": "speed-read-url-extractor"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -60,7 +60,7 @@ def main():
     
     # Run the server
     uvicorn.run(
-        "agui_integration:app",
+        "backend.routes:app",
         host=host,
         port=port,
         reload=reload,
@@ -4,6 +4,7 @@
 import os
 import sys
 import asyncio
+import logging
 from dotenv import load_dotenv
 
 # Add src to path
@@ -14,7 +15,7 @@ load_dotenv()
 
 # Import backend modules
 from backend.firecrawl_config import get_firecrawl_config
-from backend.llm_prompts import ContentProcessor
+from backend.llm_prompts import get_content_processor
 
 
 async def test_extraction():
@@ -52,10 +53,10 @@ async def test_extraction():
     test_long_url = "https://en.wikipedia.org/wiki/World_War_II"
     
     try:
-        # Test extraction (BeautifulSoup as default)
+        # Test extraction (direct HTML parsing as default)
         print("\n1. Testing content extraction...")
         firecrawl = get_firecrawl_config()
-        extraction = firecrawl.extract_content(test_url)
+        extraction = await firecrawl.extract_content(test_url)
         
         if extraction["success"]:
             method = extraction['metadata'].get('extraction_method', 'unknown')
@@ -68,7 +69,7 @@ async def test_extraction():
         
         # Test LLM cleaning
         print("\n2. Testing LLM content cleaning...")
-        processor = ContentProcessor()
+        processor = get_content_processor()
         cleaned = await processor.process_for_reading(extraction['content'])
         
         if cleaned["success"]:
@@ -83,7 +84,7 @@ async def test_extraction():
         print("\n3. Testing with simpler URL...")
         print(f"   Testing with URL: {test_fallback_url}")
         
-        simple_result = firecrawl.extract_content(test_fallback_url)
+        simple_result = await firecrawl.extract_content(test_fallback_url)
         
         if simple_result["success"]:
             method = simple_result['metadata'].get('extraction_method', 'unknown')
@@ -98,7 +99,7 @@ async def test_extraction():
         print("\n4. Testing with longer article for chunking...")
         print(f"   Testing with URL: {test_long_url}")
         
-        long_extraction = firecrawl.extract_content(test_long_url)
+        long_extraction = await firecrawl.extract_content(test_long_url)
         
         if long_extraction["success"]:
             method = long_extraction['metadata'].get('extraction_method', 'unknown')
@@ -124,4 +125,5 @@ async def test_extraction():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(test_extraction())
\ No newline at end of file